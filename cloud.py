@@ -1,46 +1,59 @@
 # File: cloud.py
 
 import os
-import json
-import requests
-from datetime import datetime
+import re
+import functools
+import tempfile
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import assemblyai as aai
+import orjson
 
 import utils
-from utils.zoom import ZoomClient
-
-# Load environment variables from .env
-load_dotenv()
-
-# Pull in credentials from your .env
-ZOOM_ACCOUNT_ID = os.environ.get('ZOOM_ACCOUNT_ID')
-ZOOM_CLIENT_ID = os.environ.get('ZOOM_CLIENT_ID')
-ZOOM_CLIENT_SECRET = os.environ.get('ZOOM_CLIENT_SECRET')
-aai.settings.api_key = os.environ.get('ASSEMBLYAI_API_KEY')
-
-# Ensure all required environment variables are available
-if not all([ZOOM_ACCOUNT_ID, ZOOM_CLIENT_ID, ZOOM_CLIENT_SECRET, aai.settings.api_key]):
-    raise RuntimeError(
-        "Missing one or more required environment variables: "
-        "ZOOM_ACCOUNT_ID, ZOOM_CLIENT_ID, ZOOM_CLIENT_SECRET, ASSEMBLYAI_API_KEY"
+from utils.cache import TranscriptCache
+from utils.zoom import ZoomClient, plan_participant_downloads
+
+REQUIRED_ENV_VARS = ("ZOOM_ACCOUNT_ID", "ZOOM_CLIENT_ID", "ZOOM_CLIENT_SECRET", "ASSEMBLYAI_API_KEY")
+
+
+def _require_env():
+    """Load credentials from your .env and ensure all required environment variables are available."""
+    load_dotenv()
+    aai.settings.api_key = os.environ.get('ASSEMBLYAI_API_KEY')
+    if not all(os.environ.get(name) for name in REQUIRED_ENV_VARS):
+        raise RuntimeError(
+            "Missing one or more required environment variables: "
+            + ", ".join(REQUIRED_ENV_VARS)
+        )
+
+
+# Clients are built on first use rather than at import, so importing this module is cheap
+@functools.lru_cache(maxsize=1)
+def _zoom_client():
+    return ZoomClient(
+        account_id=os.environ['ZOOM_ACCOUNT_ID'],
+        client_id=os.environ['ZOOM_CLIENT_ID'],
+        client_secret=os.environ['ZOOM_CLIENT_SECRET']
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _transcriber():
+    # Create a multi-channel transcription config
+    config = aai.TranscriptionConfig(
+        multichannel=True,
+        # Optionally, you can specify other parameters:
+        # word_boost=["therapist", "patient"],  # if you have specific domain terms
+        # speakers_expected=2  # if you know there are exactly 2 channels
     )
+    return aai.Transcriber(config=config)
 
-# Instantiate Zoom client
-client = ZoomClient(
-    account_id=ZOOM_ACCOUNT_ID,
-    client_id=ZOOM_CLIENT_ID,
-    client_secret=ZOOM_CLIENT_SECRET
-)
 
-# Create a multi-channel transcription config
-config = aai.TranscriptionConfig(
-    multichannel=True,
-    # Optionally, you can specify other parameters:
-    # word_boost=["therapist", "patient"],  # if you have specific domain terms
-    # speakers_expected=2  # if you know there are exactly 2 channels
-)
-transcriber = aai.Transcriber(config=config)
+# Transcripts are cached by the hash of the participant audio, so reruns are free
+transcript_cache = TranscriptCache()
+# Lifetime of the per-meeting download token handed to AssemblyAI; it only has to last until
+# AssemblyAI fetches the recording when the job starts
+DOWNLOAD_TOKEN_TTL = 30 * 60  # seconds
 
 
 def save_transcript_to_json(transcript_data, filename="transcript.json"):
@@ -48,121 +61,215 @@ def save_transcript_to_json(transcript_data, filename="transcript.json"):
     Saves final transcript data to a local JSON file for demonstration purposes.
     In production, replace or extend this to save to your EHR or a secure database.
     """
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(transcript_data, f, ensure_ascii=False, indent=2)
+    # orjson serializes in a single C pass and writes UTF-8 directly
+    with open(filename, 'wb') as f:
+        f.write(orjson.dumps(transcript_data, option=orjson.OPT_INDENT_2))
 
 
-def main():
-    print("[INFO] Starting script to download Zoom recordings and transcribe with AssemblyAI.")
-
-    # -------------------------------------------------
-    # 1) FETCH TODAY'S RECORDINGS
-    # -------------------------------------------------
-    today_str = datetime.utcnow().strftime('%Y-%m-%d')
-    params = {'from': today_str}
-
-    meets = client.get_recordings(params=params)
-    if not meets.get("meetings"):
-        print(f"[INFO] No recorded meetings found for {today_str}. Exiting.")
-        return
+def transcript_filename(meeting_uuid):
+    """
+    Returns the JSON filename for a meeting's transcript. Zoom UUIDs are base64 and may contain
+    `/` and `+`, so they're mapped to their URL-safe form before use in a filename.
+    """
+    safe_uuid = meeting_uuid.replace('+', '-').replace('/', '_').rstrip('=')
+    safe_uuid = re.sub(r'[^A-Za-z0-9_-]', '_', safe_uuid)
+    return f"transcript_{safe_uuid}.json"
 
-    # Grab the first returned meeting's UUID
-    meeting_uuid = meets["meetings"][0]["uuid"]
-    print(f"[INFO] Downloading participant audio files for meeting UUID: {meeting_uuid}")
 
+def submit_meeting(client, transcriber, meeting_uuid, path='tmp'):
+    """
+    Prepares one meeting's participant audio and submits it to AssemblyAI without waiting.
+    Returns `(channel_map, cache_key, result)`, where `result` is either the cached transcript
+    response or the submitted `aai.Transcript`, still processing. Returns `None` if the
+    meeting has no participant audio to transcribe.
+    """
     # -------------------------------------------------
     # 2) DOWNLOAD PARTICIPANT FILES AND TRACK CHANNELS
     # -------------------------------------------------
     # We'll store a list: [(filepath, participantName), ...]
     # which matches the order in which we feed files to ffmpeg
     channel_map = []  # channel index -> participant name
-    path = 'tmp'
-    os.makedirs(path, exist_ok=True)
 
-    # The Zoom client method itself writes each participant file to 'tmp' directory
-    # We must replicate that logic here if we want to track the order
+    # Fetch the recording list here rather than via client.download_participant_audio_files
+    # so the participant files can be inspected before anything is downloaded
     response = client.get_meeting_recordings(meeting_uuid)
-    participant_audio_files = response['participant_audio_files']
-
-    for data in participant_audio_files:
-        # Download each participant's file manually to keep the order
-        participant_name = data['file_name'].split('-')[-1].strip()
-        download_url = data['download_url']
-
-        # 1) Build local filename
-        channel_count = channel_map.count(participant_name) + 1
-        file_label = f"{participant_name}_{channel_count}" if channel_count > 1 else participant_name
-        local_filename = f"{file_label}.m4a"
-        local_path = os.path.join(path, local_filename)
-
-        print(f"[DEBUG] Downloading file for participant '{participant_name}' to {local_path}")
-        r = client.auth_header  # just to re-auth if needed (unused variable warning is normal)
-
-        # Actually do the download
-        audio_response = requests.get(download_url, headers=client.auth_header)
-        with open(local_path, 'wb') as f:
-            f.write(audio_response.content)
-        
+    participant_audio_files = response.get('participant_audio_files') or []
+    if not participant_audio_files:
+        print(f"[INFO] No participant audio files for meeting UUID {meeting_uuid}, skipping.")
+        return None
+
+    # Resolve every participant's filename up front
+    downloads = plan_participant_downloads(participant_audio_files, path)
+    for _, local_path, participant_name in downloads:
         # Keep track of the participant name in the same order
-        channel_map.append((local_filename, participant_name))
+        channel_map.append((local_path, participant_name))
 
-    print(f"[INFO] Downloaded {len(channel_map)} participant audio files.")
+    # With a single participant there is nothing to merge, so AssemblyAI can fetch
+    # the recording straight from Zoom and the download/merge/upload is skipped
+    single_track = len(participant_audio_files) == 1
+    if single_track:
+        print("[INFO] Single participant recording, AssemblyAI will fetch it directly from Zoom.")
+        cache_key = f"zoom-{participant_audio_files[0]['id']}"
+    else:
+        os.makedirs(path, exist_ok=True)
+        for _, local_path, participant_name in downloads:
+            print(f"[DEBUG] Downloading file for participant '{participant_name}' to {local_path}")
+        # fetch them all concurrently
+        client.download_files((url, local_path) for url, local_path, _ in downloads)
+        print(f"[INFO] Downloaded {len(channel_map)} participant audio files.")
 
-    # -------------------------------------------------
-    # 3) COMBINE TRACKS INTO A SINGLE M4A
-    # -------------------------------------------------
-    combined_path = "combined_audio.m4a"
-    if os.path.exists(combined_path):
-        os.remove(combined_path)  # Remove if it exists to avoid FileExistsError
-    utils.combine_tracks(filepath=combined_path, dir=path, safe=False)
-    print(f"[INFO] Successfully merged audio into {combined_path}")
+        # utils.track_files merges tracks in filename order, so label channels in that order too
+        channel_map.sort()
+        cache_key = transcript_cache.fingerprint(utils.track_files(path))
 
     # -------------------------------------------------
-    # 4) TRANSCRIBE WITH ASSEMBLYAI
+    # 3) COMBINE TRACKS, UPLOAD AND SUBMIT (UNLESS CACHED)
     # -------------------------------------------------
-    print("[INFO] Sending combined audio to AssemblyAI for transcription...")
-    transcript = transcriber.transcribe(combined_path)
+    transcript_response = transcript_cache.get(cache_key)
+    if transcript_response is not None:
+        print(f"[INFO] Using cached transcript for this audio ({cache_key[:12]})")
+        return channel_map, cache_key, transcript_response
 
-    num_channels = transcript.json_response['audio_channels']
-    print(f"[INFO] Number of channels in final transcript: {num_channels}")
+    if single_track:
+        # Never hand out the account-wide OAuth token: ask Zoom for a short-lived token that
+        # can only download this meeting's recordings, which download URLs accept as a query parameter
+        response = client.get_meeting_recordings(
+            meeting_uuid,
+            params={'include_fields': 'download_access_token', 'ttl': DOWNLOAD_TOKEN_TTL},
+        )
+        download_url = participant_audio_files[0]['download_url']
+        separator = '&' if '?' in download_url else '?'
+        audio_url = f"{download_url}{separator}access_token={response['download_access_token']}"
+    else:
+        # ffmpeg's output is uploaded as it is produced, so the merged audio never hits disk
+        print("[INFO] Merging participant audio and uploading to AssemblyAI...")
+        with utils.stream_combined_tracks(dir=path) as audio:
+            audio_url = utils.upload_audio(audio, aai.settings.api_key)
+        print("[INFO] Successfully merged and uploaded combined audio")
 
-    # -------------------------------------------------
-    # 5) LABEL CHANNELS & PRINT RESULTS
-    # -------------------------------------------------
+    print("[INFO] Submitting audio to AssemblyAI for transcription...")
+    return channel_map, cache_key, transcriber.submit(audio_url)
+
+
+def label_utterances(transcript_response, channel_map):
+    """
+    Maps each utterance's channel back to its participant, printing the results.
+    """
     final_utterances = []
-    for utt in transcript.utterances:
-        # Convert channel to int in case it is a string
-        ch_idx = int(utt.channel)
+    for utt in transcript_response['utterances']:
+        # AssemblyAI numbers channels from 1 (as a string), channel_map is 0-indexed
+        ch_idx = int(utt['channel']) - 1
 
         # If there's a mismatch in the number of channels vs participants, handle gracefully
-        if ch_idx < len(channel_map):
+        if 0 <= ch_idx < len(channel_map):
             participant_name = channel_map[ch_idx][1]
         else:
-            participant_name = f"UnknownChannel{ch_idx}"
+            participant_name = f"UnknownChannel{utt['channel']}"
 
         labeled_utterance = {
             "participant": participant_name,
-            "start_ms": utt.start,
-            "end_ms": utt.end,
-            "text": utt.text,
-            "confidence": utt.confidence
+            "start_ms": utt['start'],
+            "end_ms": utt['end'],
+            "text": utt['text'],
+            "confidence": utt['confidence']
         }
         final_utterances.append(labeled_utterance)
 
         # Print to console
-        print(f"({participant_name}) {utt.text}")
+        print(f"({participant_name}) {utt['text']}")
+
+    return final_utterances
+
+
+def finish_meeting(meeting_uuid, channel_map, cache_key, result):
+    """
+    Waits for one meeting's transcript (unless it came from the cache), then labels,
+    prints and saves it.
+    """
+    # -------------------------------------------------
+    # 4) WAIT FOR ASSEMBLYAI TRANSCRIPTION
+    # -------------------------------------------------
+    if isinstance(result, aai.Transcript):
+        print(f"[INFO] Waiting for transcript of meeting UUID: {meeting_uuid}")
+        transcript = result.wait_for_completion()
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription failed: {transcript.error}")
+        transcript_response = transcript_cache.put(cache_key, transcript.json_response)
+    else:
+        transcript_response = result
+
+    num_channels = transcript_response['audio_channels']
+    print(f"[INFO] Number of channels in final transcript: {num_channels}")
+
+    # -------------------------------------------------
+    # 5) LABEL CHANNELS & PRINT RESULTS
+    # -------------------------------------------------
+    final_utterances = label_utterances(transcript_response, channel_map)
 
     # -------------------------------------------------
     # 6) SAVE TRANSCRIPT DATA
     # -------------------------------------------------
     transcript_data = {
         "meeting_uuid": meeting_uuid,
-        "transcribed_at": datetime.utcnow().isoformat(),
+        "transcribed_at": datetime.now(timezone.utc).isoformat(),
         "num_channels": num_channels,
         "utterances": final_utterances
     }
-    save_transcript_to_json(transcript_data, filename="transcript.json")
-    print("[INFO] Transcript successfully labeled and saved to transcript.json.")
+    # named by meeting, so a rerun or a failed meeting never leaves another meeting's transcript
+    # under its name
+    filename = transcript_filename(meeting_uuid)
+    save_transcript_to_json(transcript_data, filename=filename)
+    print(f"[INFO] Transcript successfully labeled and saved to {filename}.")
+
+
+def main():
+    print("[INFO] Starting script to download Zoom recordings and transcribe with AssemblyAI.")
+    _require_env()
+    client = _zoom_client()
+    transcriber = _transcriber()
+
+    # -------------------------------------------------
+    # 1) FETCH TODAY'S RECORDINGS
+    # -------------------------------------------------
+    today_str = datetime.now(timezone.utc).date().isoformat()
+    params = {'from': today_str, 'page_size': 300}
+
+    # Zoom pages the recording list, so follow `next_page_token` until every meeting is in
+    meetings = []
+    while True:
+        meets = client.get_recordings(params=params)
+        meetings.extend(meets.get("meetings") or [])
+        if not meets.get("next_page_token"):
+            break
+        params = {**params, 'next_page_token': meets["next_page_token"]}
+    if not meetings:
+        print(f"[INFO] No recorded meetings found for {today_str}. Exiting.")
+        return
+    print(f"[INFO] Found {len(meetings)} recorded meetings for {today_str}.")
+
+    # Submit every meeting before waiting on any, so AssemblyAI transcribes them in parallel
+    jobs = []  # [(meeting_uuid, channel_map, cache_key, result), ...]
+    for meeting in meetings:
+        meeting_uuid = meeting["uuid"]
+        print(f"[INFO] Preparing participant audio files for meeting UUID: {meeting_uuid}")
+        # Fresh scratch directory per meeting: no stale tracks from earlier runs get merged in,
+        # and it's removed once the merged audio has been uploaded
+        try:
+            with tempfile.TemporaryDirectory(prefix='zoom_') as path:
+                job = submit_meeting(client, transcriber, meeting_uuid, path=path)
+        except Exception as e:
+            # one bad meeting shouldn't stop the others from being transcribed and saved
+            print(f"[ERROR] Could not submit meeting UUID {meeting_uuid}: {e}")
+            continue
+        if job is not None:
+            jobs.append((meeting_uuid, *job))
+
+    for meeting_uuid, channel_map, cache_key, result in jobs:
+        try:
+            finish_meeting(meeting_uuid, channel_map, cache_key, result)
+        except Exception as e:
+            # the remaining meetings are already submitted (and billed), so still save them
+            print(f"[ERROR] Could not transcribe meeting UUID {meeting_uuid}: {e}")
 
 
 if __name__ == "__main__":
@@ -1,32 +1,52 @@
+import functools
 import os
 
 from dotenv import load_dotenv
 import assemblyai as aai
 
 import utils
+from utils.cache import TranscriptCache
 
-# load environment variables
-load_dotenv()
 
-aai.settings.api_key = os.environ.get('ASSEMBLYAI_API_KEY')
+def _require_env():
+    """Load environment variables and ensure all required ones are available."""
+    load_dotenv()
+    aai.settings.api_key = os.environ.get('ASSEMBLYAI_API_KEY')
+    if not aai.settings.api_key:
+        raise RuntimeError("Missing ASSEMBLYAI_API_KEY")
 
-# ensure all required environment variables are available
-if not aai.settings.api_key:
-    raise RuntimeError("Missing ASSEMBLYAI_API_KEY")
 
-# instantiate AssemblyAI transcriber with multichannel speech-to-text enabled
-config = aai.TranscriptionConfig(multichannel=True)
-transcriber = aai.Transcriber(config=config)
+@functools.lru_cache(maxsize=1)
+def _transcriber():
+    # instantiate AssemblyAI transcriber with multichannel speech-to-text enabled
+    config = aai.TranscriptionConfig(multichannel=True)
+    return aai.Transcriber(config=config)
+
+
+transcript_cache = TranscriptCache()
+
 
 def main():
-    # combine all participant audio files into a single audio file
-    path = "combined_audio.m4a"
-    utils.combine_tracks(path, dir="recordings")
-    
-    # send to AssemblyAI for multichannel speech-to-text and print the results
-    transcript = transcriber.transcribe(path)
-    print(f"Number of channels: {transcript.json_response['audio_channels']}")
-    for utt in transcript.utterances:
+    _require_env()
+    transcriber = _transcriber()
+
+    # skip transcription entirely if this exact audio has been transcribed before
+    cache_key = transcript_cache.fingerprint(utils.track_files("recordings"))
+    transcript_response = transcript_cache.get(cache_key)
+    if transcript_response is None:
+        # combine all participant audio files into a single audio stream and upload it as it's encoded
+        with utils.stream_combined_tracks(dir="recordings") as audio:
+            upload_url = utils.upload_audio(audio, aai.settings.api_key)
+
+        # send to AssemblyAI for multichannel speech-to-text
+        transcript = transcriber.transcribe(upload_url)
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription failed: {transcript.error}")
+        transcript_response = transcript_cache.put(cache_key, transcript.json_response)
+
+    # print the results
+    print(f"Number of channels: {transcript_response['audio_channels']}")
+    for utt in transcript_response['utterances']:
         print(utt)
 
 if __name__ == "__main__":
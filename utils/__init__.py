@@ -1,14 +1,24 @@
 import os
 import subprocess
+import tempfile
+from contextlib import contextmanager
 
-def combine_tracks(filepath="combined_audio.m4a", dir="tmp", safe=True):
-    if safe and os.path.exists(filepath):
-        raise FileExistsError(f"The file '{filepath}' already exists.")
-        
-    input_files = [os.path.join(dir, file) for file in os.listdir(dir) if file.endswith('.m4a')]
-    if not input_files:
-        raise ValueError("No input files found in the 'tmp' directory.")
+import requests
+
+ASSEMBLYAI_UPLOAD_URL = "https://api.assemblyai.com/v2/upload"
+
+
+def track_files(dir="tmp"):
+    """Return the participant tracks in `dir`, in the order they are merged into channels.
+
+    Sorted by filename so channel N maps to the same participant on every filesystem.
+    """
+    with os.scandir(dir) as it:
+        return sorted(e.path for e in it if e.is_file() and e.name.endswith('.m4a'))
 
+
+def _merge_args(input_files):
+    """Build the ffmpeg input/filter/encoder args merging each file into its own channel."""
     input_args = []
     amerge_inputs = []
 
@@ -18,18 +28,81 @@ def combine_tracks(filepath="combined_audio.m4a", dir="tmp", safe=True):
 
     amerge_filter = f"{''.join(amerge_inputs)}amerge=inputs={len(input_files)}[out]"
 
-    ffmpeg_command = [
-        "ffmpeg",
-        "-y" if not safe else "-n",  # overwrite (-y) or not (-n)
+    return [
+        "-filter_complex_threads", str(os.cpu_count() or 1),
         *input_args,
         "-filter_complex", amerge_filter,
         "-map", "[out]",
         "-ac", str(len(input_files)),
+        # AssemblyAI multichannel needs one N-channel stream, so amerge has to
+        # re-encode; make the encode explicit and let it use every core
+        "-c:a", "aac",
+        "-aac_coder", "fast",  # much cheaper than the default twoloop coder, fine for speech
+        "-b:a", f"{64 * len(input_files)}k",  # 64k per channel is plenty for speech
+        "-threads", "0",
+    ]
+
+
+def combine_tracks(filepath="combined_audio.m4a", dir="tmp", safe=True):
+    if safe and os.path.exists(filepath):
+        raise FileExistsError(f"The file '{filepath}' already exists.")
+        
+    input_files = track_files(dir)
+    if not input_files:
+        raise ValueError("No input files found in the 'tmp' directory.")
+
+    ffmpeg_command = [
+        "ffmpeg",
+        "-y" if not safe else "-n",  # overwrite (-y) or not (-n)
+        "-nostats", "-loglevel", "error",  # only capture real errors
+        *_merge_args(input_files),
+        "-movflags", "+faststart",  # moov atom up front so the file streams
         filepath
     ]
 
     try:
-        subprocess.run(ffmpeg_command, check=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+        subprocess.run(ffmpeg_command, check=True, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL)
     except subprocess.CalledProcessError as e:
         error_message = e.stderr.decode() if e.stderr else f"No detailed error message available. Raw error: {str(e)}"
         raise RuntimeError(f"FFmpeg error: {error_message}") from e
+
+
+@contextmanager
+def stream_combined_tracks(dir="tmp"):
+    """Merge the tracks in `dir` like `combine_tracks`, yielding ffmpeg's output as a
+    readable binary stream instead of writing it to disk."""
+    input_files = track_files(dir)
+    if not input_files:
+        raise ValueError(f"No input files found in the '{dir}' directory.")
+
+    ffmpeg_command = [
+        "ffmpeg",
+        "-nostats", "-loglevel", "error",  # only capture real errors
+        *_merge_args(input_files),
+        "-f", "adts",  # unlike mp4, raw AAC can be written to a pipe
+        "pipe:1"
+    ]
+
+    # stderr goes to a file, not a pipe: nothing reads it until ffmpeg exits, and a damaged track
+    # can log an error per frame, which would fill a pipe and stall ffmpeg (and the upload) forever
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            yield process.stdout
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+            error_message = stderr.decode() if stderr else f"ffmpeg exited with status {returncode}"
+            raise RuntimeError(f"FFmpeg error: {error_message}")
+
+
+def upload_audio(audio, api_key, chunk_size=1 << 20):
+    """Upload a binary stream to AssemblyAI as it is read, returning the `upload_url`
+    to transcribe."""
+    chunks = iter(lambda: audio.read(chunk_size), b"")  # sent chunked, no length needed
+    response = requests.post(ASSEMBLYAI_UPLOAD_URL, headers={"authorization": api_key}, data=chunks)
+    response.raise_for_status()
+    return response.json()["upload_url"]
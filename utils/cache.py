@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import tempfile
+
+
+class TranscriptCache:
+    """On-disk cache of AssemblyAI transcript responses, keyed by a hash of the source audio."""
+
+    # Only what's needed to label utterances is kept: the full response also echoes `audio_url`,
+    # which can carry a Zoom download token
+    FIELDS = ("audio_channels", "utterances")
+
+    def __init__(self, path=".cache/transcripts", max_entries=100) -> None:
+        self.path = path
+        self.max_entries = max_entries
+
+    @staticmethod
+    def fingerprint(files, chunk_size=1 << 20):
+        """Hash the contents of `files`, in order, so the same tracks merged the same way share a key."""
+        h = hashlib.blake2b(digest_size=32)
+        for file in files:
+            h.update(str(os.path.getsize(file)).encode())  # delimit files
+            with open(file, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached transcript response for `key`, or `None` on a miss."""
+        entry = self._entry(key)
+        try:
+            with open(entry, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # unreadable or corrupt, drop it so the transcript is fetched (and cached) again
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+            return None
+        os.utime(entry)  # mark as recently used
+        return data
+
+    def put(self, key, data):
+        """Store the `FIELDS` of a transcript response, evicting the least recently used entries
+        past `max_entries`. Returns the stored entry, so callers see exactly what a later `get` will."""
+        data = {field: data[field] for field in self.FIELDS}
+        os.makedirs(self.path, exist_ok=True)
+        # write to a temp file and swap it in, so an interrupted write never leaves a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._entry(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        with os.scandir(self.path) as it:
+            entries = sorted(
+                (e for e in it if e.is_file() and e.name.endswith('.json')),
+                key=lambda e: e.stat().st_mtime,
+                reverse=True,
+            )
+        for e in entries[self.max_entries:]:
+            os.remove(e.path)
+        return data
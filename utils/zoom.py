@@ -1,10 +1,17 @@
+import json
 import os
+import shutil
+import tempfile
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
-from urllib.parse import urljoin
+from urllib.parse import quote, urljoin
 from functools import wraps
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 class ZoomAPIError(Exception):
@@ -30,6 +37,11 @@ def api_call(func: Callable[..., requests.Response]):
             raise TypeError(
                 f"Function `{func.__name__}` must return a `requests.Response` object."
             )
+        # a persisted token can be rejected before its expiry (revoked, or the app secret
+        # rotated), so drop it and retry once with a freshly issued one
+        if response.status_code == 401 and args and hasattr(args[0], '_invalidate_token'):
+            args[0]._invalidate_token()
+            response = func(*args, **kwargs)
         if response.status_code != 200:
             try:
                 error_message = response.json().get("message", "Unknown error")
@@ -44,20 +56,124 @@ def api_call(func: Callable[..., requests.Response]):
     return wrapper
 
 
+def plan_participant_downloads(participant_audio_files, path='tmp'):
+    """Resolve each participant audio file to a unique local path.
+
+    Returns `(download_url, filepath, participant_name)` tuples in the order given.
+    A repeated participant name gets a numeric suffix (`name`, `name_2`, ...).
+    """
+    # keep track of number of occurrences so don't have same filename if a name is repeated
+    names = Counter()
+    used = set()  # casefolded, so paths also stay distinct on case-insensitive filesystems
+    downloads = []
+    for data in participant_audio_files:
+        name = data['file_name'].split('-')[-1].strip()
+        names[name] += 1
+        # a suffixed name can collide with a participant really called e.g. "Bob_2",
+        # so keep bumping the suffix until the filename is free
+        while True:
+            filename = name + (f"_{names[name]}" if names[name] > 1 else '')
+            if filename.casefold() not in used:
+                break
+            names[name] += 1
+        used.add(filename.casefold())
+        downloads.append((data['download_url'], os.path.join(path, f'{filename}.m4a'), name))
+    return downloads
+
+
 class ZoomClient:
     BASE_URL = "https://api.zoom.us/v2/"
     AUTH_URL = "https://zoom.us/oauth/"
+    DOWNLOAD_WORKERS = 8
+    TOKEN_CACHE = os.path.expanduser("~/.cache/zoom_client/token.json")
+    TOKEN_EXPIRY_MARGIN = 60  # seconds before `expiry` that a token is treated as expired
 
-    def __init__(self, account_id, client_id, client_secret) -> None:
+    def __init__(self, account_id, client_id, client_secret, token_cache=TOKEN_CACHE) -> None:
         self.account_id = account_id
         self.client_id = client_id
         self.client_secret = client_secret
+        self.token_cache = token_cache  # `None` disables persisting the token
         self._access_token = None
         self._token_expiry = None  # Track token expiration time
+        self._auth_header = None  # Rebuilt only when the token changes
+        self._load_cached_token()
+
+        # share one connection pool across API calls and downloads (keep-alive)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            # retry transient failures with exponential backoff; once retries run out the
+            # last response is returned so `api_call` still reports it as a `ZoomAPIError`.
+            # `Retry-After` is ignored: on Zoom's daily rate limit it can ask for hours, and an
+            # unattended run should fail with the 429 rather than hang
+            max_retries=Retry(
+                total=5,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET", "POST"],
+                raise_on_status=False,
+                respect_retry_after_header=False,
+            ),
+        )
+        self._session.mount("https://", adapter)
+
+    def _load_cached_token(self):
+        """Reuse a token saved by a previous run for the same account and client."""
+        if not self.token_cache:
+            return
+        try:
+            with open(self.token_cache) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (
+            cached.get("account_id") == self.account_id
+            and cached.get("client_id") == self.client_id
+            and cached.get("token")
+            and cached.get("expiry")
+        ):
+            self._access_token = cached.get("token")
+            self._token_expiry = cached.get("expiry")
+            self._auth_header = {"Authorization": f"Bearer {self._access_token}"}
+
+    def _save_cached_token(self):
+        """Persist the current token (owner read/write only) so later runs skip the OAuth round trip."""
+        if not self.token_cache:
+            return
+        cache_dir = os.path.dirname(self.token_cache) or '.'
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temp file and swap it in, so concurrent refreshes (download threads,
+        # overlapping runs) can't interleave and leave a corrupt file
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            os.fchmod(fd, 0o600)
+            with open(fd, 'w') as f:
+                json.dump({
+                    "account_id": self.account_id,
+                    "client_id": self.client_id,
+                    "token": self._access_token,
+                    "expiry": self._token_expiry,
+                }, f)
+            os.replace(tmp_path, self.token_cache)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _invalidate_token(self):
+        """Forget the current token, in memory and on disk, so the next request fetches a new one."""
+        self._access_token = None
+        self._token_expiry = None
+        self._auth_header = None
+        if self.token_cache:
+            try:
+                os.remove(self.token_cache)
+            except FileNotFoundError:
+                pass
 
     def _is_token_expired(self):
-        """Check if the current token has expired."""
-        return self._token_expiry and time.time() >= self._token_expiry
+        """Check if the current token has expired, or is about to."""
+        return self._token_expiry and time.time() >= self._token_expiry - self.TOKEN_EXPIRY_MARGIN
 
     def _refresh_token(self):
         """Refresh the access token if expired."""
@@ -67,47 +183,67 @@ class ZoomClient:
             "client_id": self.client_id,
             "client_secret": self.client_secret,
         }
-        response = requests.post(urljoin(self.AUTH_URL, "token"), data=data)
+        response = self._session.post(urljoin(self.AUTH_URL, "token"), data=data)
         response.raise_for_status()
         token_data = response.json()
         self._access_token = token_data["access_token"]
         self._token_expiry = time.time() + token_data["expires_in"]
+        self._auth_header = {"Authorization": f"Bearer {self._access_token}"}
+        self._save_cached_token()
+
+    def _ensure_token(self):
+        """Refresh the access token (and with it the auth header) if missing or expired."""
+        if self._access_token is None or self._is_token_expired():
+            self._refresh_token()
 
     @property
     def access_token(self):
         """Return a valid access token, refreshing if expired."""
-        if self._access_token is None or self._is_token_expired():
-            self._refresh_token()
+        self._ensure_token()
         return self._access_token
 
     @property
     def auth_header(self):
-        return {"Authorization": f"Bearer {self.access_token}"}
+        """Return the cached Authorization header for a valid access token."""
+        self._ensure_token()
+        return self._auth_header
 
     @api_call
     def get_recordings(self, params=None):
         url = urljoin(self.BASE_URL, "users/me/recordings")
-        return requests.get(url, headers=self.auth_header, params=params)
+        return self._session.get(url, headers=self.auth_header, params=params)
 
     @api_call
     def get_meeting_recordings(self, meeting_uuid, params=None):
+        # Zoom requires UUIDs that start with `/` or contain `//` to be double URL-encoded
+        if meeting_uuid.startswith('/') or '//' in meeting_uuid:
+            meeting_uuid = quote(quote(meeting_uuid, safe=''), safe='')
         url = urljoin(self.BASE_URL, f"meetings/{meeting_uuid}/recordings")
-        return requests.get(url, headers=self.auth_header, params=params)
+        return self._session.get(url, headers=self.auth_header, params=params)
+
+    def _download_one(self, url, filepath):
+        """Download a single recording file to `filepath`."""
+        with self._session.get(url, headers=self.auth_header, stream=True) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True  # undo any transfer compression
+            with open(filepath, 'wb') as f:
+                # copy in 1 MiB chunks so memory use doesn't grow with file size
+                shutil.copyfileobj(r.raw, f, length=1 << 20)
+
+    def download_files(self, downloads):
+        """Download `(url, filepath)` pairs concurrently, since each one is network bound."""
+        with ThreadPoolExecutor(max_workers=self.DOWNLOAD_WORKERS) as executor:
+            futures = [executor.submit(self._download_one, url, filepath) for url, filepath in downloads]
+            for future in futures:
+                future.result()
 
     def download_participant_audio_files(self, meeting_uuid, path='tmp'):
-        # keep track of number of occurrences so don't have same filename if a name is repeated
-        names = {}
+        """Download every participant's audio for a meeting into `path`.
+
+        Returns `(filepath, participant_name)` tuples in the order Zoom lists them.
+        """
         os.makedirs(path, exist_ok=True)
         response = self.get_meeting_recordings(meeting_uuid)
-        for data in response['participant_audio_files']:
-            name = data['file_name'].split('-')[-1].strip()
-            if name in names:
-                names[name] += 1
-            else:
-                names[name] = 1
-            filename = name + (f"_{names[name]}" if names[name] > 1 else '')
-            
-            url = data['download_url']
-            r = requests.get(url, headers=self.auth_header)
-            with open(f'{path}/{filename}.m4a', 'wb') as f:
-                f.write(r.content)
+        downloads = plan_participant_downloads(response['participant_audio_files'], path)
+        self.download_files((url, filepath) for url, filepath, _ in downloads)
+        return [(filepath, name) for _, filepath, name in downloads]